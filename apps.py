@@ -1,54 +1,231 @@
 import streamlit as st
 import pandas as pd
+import numpy as np
 import joblib
+import logging
+import os
 import networkx as nx
 import matplotlib.pyplot as plt
 from io import BytesIO
+from sklearn.ensemble import ExtraTreesRegressor, RandomForestRegressor
+from sklearn.tree import DecisionTreeRegressor
+
+import emission_kernels
+import route_kernels
+
+logger = logging.getLogger(__name__)
+
+# Faster Excel writer when installed, else the openpyxl engine used before
+try:
+    import xlsxwriter  # noqa: F401
+    EXCEL_ENGINE = "xlsxwriter"
+except ImportError:
+    EXCEL_ENGINE = "openpyxl"
 
 # ---------------------------
 # Load trained model + encoder
 # ---------------------------
-MODEL = joblib.load("carbon_model.pkl")
-LE = joblib.load("label_encoder.pkl")
+@st.cache_resource
+def load_raw_model():
+    return joblib.load("carbon_model.pkl")
+
+
+@st.cache_resource
+def load_model():
+    return load_raw_model(), joblib.load("label_encoder.pkl")
+
+
+MODEL, LE = load_model()
+
+
+@st.cache_resource
+def mode_index():
+    return {c: i for i, c in enumerate(LE.classes_)}
+
+
+@st.cache_resource
+def compiled_model():
+    # Compile tree ensembles with sklearn-compiledtrees on the first prediction, not at page load
+    try:
+        from compiledtrees import CompiledRegressionPredictor
+    except ImportError:
+        return None
+
+    model = load_raw_model()
+    try:
+        if CompiledRegressionPredictor.compilable(model):
+            return CompiledRegressionPredictor(model)
+    except Exception:
+        logger.warning("compiledtrees could not compile the model; using sklearn predict", exc_info=True)
+    return None
+
+
+def predict_emissions(X):
+    compiled = compiled_model()
+    if compiled is not None:
+        # The compiled predictor only accepts C-contiguous float32 input
+        return compiled.predict(np.ascontiguousarray(X, dtype=np.float32))
+    return MODEL.predict(X)
+
+# ---------------------------
+# Numba single-row predictor
+# ---------------------------
+@st.cache_resource
+def load_single_predictor():
+    # Numba-backed f(distance, weight, mode_enc) -> float, or None if unsupported
+    if not emission_kernels.HAVE_NUMBA:
+        return None
+
+    model = load_raw_model()
+
+    if isinstance(model, DecisionTreeRegressor):
+        arrays = emission_kernels.stack_trees([model.tree_])
+
+        def predict(*row):
+            # sklearn compares features as float32 against float64 thresholds
+            x = np.asarray(row, dtype=np.float32)
+            return emission_kernels.predict_tree(x, *(a[0] for a in arrays))
+        return predict
+
+    if isinstance(model, (RandomForestRegressor, ExtraTreesRegressor)):
+        arrays = emission_kernels.stack_trees([est.tree_ for est in model.estimators_])
+
+        def predict(*row):
+            x = np.asarray(row, dtype=np.float32)
+            return emission_kernels.predict_forest(x, *arrays)
+        return predict
+
+    coef = getattr(model, "coef_", None)
+    if coef is not None and np.ndim(coef) == 1:
+        coef = np.asarray(coef, dtype=np.float64)
+        intercept = float(model.intercept_)
+
+        def predict(*row):
+            return emission_kernels.predict_linear(np.asarray(row, dtype=np.float64), coef, intercept)
+        return predict
+
+    return None
 
 # ---------------------------
 # Load supply chain data
 # ---------------------------
-sc_df = pd.read_csv("carbon_footprint_supply_chain.csv")
+SC_CSV = "carbon_footprint_supply_chain.csv"
+SC_COLUMNS = {"origin", "destination", "distance_km", "transport_mode", "co2_emissions_kg"}
+
+
+@st.cache_data(persist="disk")
+def load_sc(csv_mtime):
+    # csv_mtime only keys the persisted cache so an edited CSV is reloaded
+    # Only parse the columns the app uses
+    df = pd.read_csv(
+        SC_CSV,
+        usecols=lambda c: c.strip().lower() in SC_COLUMNS
+    )
+
+    # Standardize column names
+    df.columns = df.columns.str.strip().str.lower()
+
+    # Rename required columns
+    df.rename(columns={
+        "origin": "origin",
+        "destination": "destination",
+        "distance_km": "distance_km",
+        "transport_mode": "mode",
+        "co2_emissions_kg": "emissions_kgco2e"
+    }, inplace=True)
+
+    # Downcast numerics
+    df = df.astype({"distance_km": "float32", "emissions_kgco2e": "float32"})
+
+    # Low-cardinality labels as categoricals (integer-coded masks, deduped options)
+    for c in ("origin", "destination", "mode"):
+        df[c] = df[c].astype("category")
+    return df
 
-# Standardize column names
-sc_df.columns = sc_df.columns.str.strip().str.lower()
 
-# Rename required columns
-sc_df.rename(columns={
-    "shipment_id": "shipment_id",
-    "origin": "origin",
-    "destination": "destination",
-    "distance_km": "distance_km",
-    "transport_mode": "mode",
-    "fuel_type": "fuel_type",
-    "load_utilization_%": "load_utilization",
-    "fuel_consumed_l": "fuel_consumed_l",
-    "co2_emissions_kg": "emissions_kgco2e",
-    "shipment_weight_kg": "weight_kg",   
-    "delivery_time_hr": "delivery_time_hr",
-    "cost_usd": "cost_usd"
-}, inplace=True)
+SC_MTIME = os.path.getmtime(SC_CSV)
 
-# Convert weight to tons
-sc_df["weight_tons"] = sc_df["weight_kg"] / 1000.0
+
+@st.cache_data
+def uniques(csv_mtime):
+    df = load_sc(csv_mtime)
+    return (
+        df["origin"].cat.categories.tolist(),
+        df["destination"].cat.categories.tolist(),
+        df["mode"].cat.categories.tolist()
+    )
+
+
+orig_opts, dest_opts, mode_opts = uniques(SC_MTIME)
 
 # ---------------------------
 # Build graph for shortest path
 # ---------------------------
-G = nx.DiGraph()
-for _, row in sc_df.iterrows():
-    G.add_edge(
-        row["origin"],
-        row["destination"],
-        distance=row["distance_km"],
-        emission=row["emissions_kgco2e"]
+def build_graph(df):
+    o = df["origin"].to_numpy()
+    d = df["destination"].to_numpy()
+    dist = df["distance_km"].to_numpy()
+    em = df["emissions_kgco2e"].to_numpy()
+
+    G = nx.DiGraph()
+    G.add_edges_from(
+        (u, v, {"distance": a, "emission": b}) for u, v, a, b in zip(o, d, dist, em)
     )
+    return G
+
+
+@st.cache_resource
+def graphs_by_mode(csv_mtime):
+    # One graph per transport mode plus the unfiltered one, built once
+    df = load_sc(csv_mtime)
+    out = {"All": build_graph(df)}
+    for m in df["mode"].cat.categories:
+        out[m] = build_graph(df[df["mode"] == m])
+    return out
+
+
+GRAPHS = graphs_by_mode(SC_MTIME)
+
+
+# ---------------------------
+# CSR arrays for route search
+# ---------------------------
+@st.cache_resource
+def csr_graph(csv_mtime, mode_filter="All"):
+    # CSR (indptr, indices, emission weight) of one modal graph, indexed over all locations
+    graphs = graphs_by_mode(csv_mtime)
+    names = list(graphs["All"].nodes)
+    name_to_idx = {n: i for i, n in enumerate(names)}
+    edges = list(graphs[mode_filter].edges(data="emission"))
+
+    src = np.array([name_to_idx[u] for u, _, _ in edges], dtype=np.int64)
+    dst = np.array([name_to_idx[v] for _, v, _ in edges], dtype=np.int64)
+    w = np.array([e for _, _, e in edges], dtype=np.float64)
+
+    order = np.argsort(src, kind="stable")
+    indptr = np.zeros(len(names) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(src, minlength=len(names)), out=indptr[1:])
+    return indptr, dst[order], w[order], names, name_to_idx
+
+
+def lowest_emission_routes(start, end, k, csv_mtime, mode_filter="All"):
+    # Up to k routes ordered by (emission, hop count); the first one is the optimal route
+    indptr, indices, w, names, name_to_idx = csr_graph(csv_mtime, mode_filter)
+    idx_routes = route_kernels.k_shortest_paths(indptr, indices, w, name_to_idx[start], name_to_idx[end], k)
+    routes = [[names[i] for i in r] for r in idx_routes]
+
+    if not routes:
+        raise nx.NetworkXNoPath(f"No path between {start} and {end}.")
+    return routes
+
+# ---------------------------
+# Distance lookup for auto-fetch
+# ---------------------------
+@st.cache_data
+def dist_lookup(csv_mtime):
+    # Keep the first matching row per (origin, destination, mode)
+    df = load_sc(csv_mtime).drop_duplicates(["origin", "destination", "mode"])
+    return dict(zip(zip(df["origin"], df["destination"], df["mode"]), df["distance_km"].to_numpy()))
 
 # ---------------------------
 # Streamlit UI
@@ -68,17 +245,25 @@ feature = st.sidebar.radio("Choose an option:", [
 if feature == "Carbon Emission Calculator":
     st.subheader("Carbon Emission Calculator")
 
-    distance = st.number_input("Distance (km)", min_value=1, value=100)
-    weight = st.number_input("Weight (tons)", min_value=1.0, value=10.0)
-    mode = st.selectbox("Transport Mode", LE.classes_)
-
-    # Encode mode
-    mode_enc = LE.transform([mode])[0]
-
-    # Predict
-    pred = MODEL.predict([[distance, weight, mode_enc]])[0]
+    # Inputs inside a form so the model only runs on submit
+    with st.form("calc"):
+        distance = st.number_input("Distance (km)", min_value=1, value=100)
+        weight = st.number_input("Weight (tons)", min_value=1.0, value=10.0)
+        mode = st.selectbox("Transport Mode", LE.classes_)
+        submitted = st.form_submit_button("Predict")
+
+    if submitted:
+        # Encode mode
+        mode_enc = mode_index()[mode]
+
+        # Predict (Numba kernel for a single row when the model type is supported)
+        predict_one = load_single_predictor()
+        if predict_one is not None:
+            pred = predict_one(distance, weight, mode_enc)
+        else:
+            pred = predict_emissions([[distance, weight, mode_enc]])[0]
 
-    st.success(f"✅ Estimated Carbon Emission: {pred:.2f} kg CO₂e")
+        st.success(f"✅ Estimated Carbon Emission: {pred:.2f} kg CO₂e")
 
 
 # ---------------------------
@@ -87,58 +272,47 @@ if feature == "Carbon Emission Calculator":
 elif feature == "Shortest Route Finder":
     st.subheader("🚚 Find Shortest Route (by carbon emissions)")
 
-    start = st.selectbox("Select Start Location", sc_df["origin"].unique())
-    end = st.selectbox("Select Destination", sc_df["destination"].unique())
-    transport_choice = st.selectbox("Filter by Transport Mode (optional)", ["All"] + list(sc_df["mode"].unique()))
+    start = st.selectbox("Select Start Location", orig_opts)
+    end = st.selectbox("Select Destination", dest_opts)
+    transport_choice = st.selectbox("Filter by Transport Mode (optional)", ["All"] + mode_opts)
 
     if st.button("Find Route"):
         try:
-            # Build filtered graph
-            G_filtered = nx.DiGraph()
-            for _, row in sc_df.iterrows():
-                if transport_choice == "All" or row["mode"] == transport_choice:
-                    G_filtered.add_edge(
-                        row["origin"],
-                        row["destination"],
-                        distance=row["distance_km"],
-                        emission=row["emissions_kgco2e"]
-                    )
-
-            # Find optimal route
-            path = nx.shortest_path(G_filtered, source=start, target=end, weight="emission")
-            total_emission = sum(G_filtered[path[i]][path[i + 1]]["emission"] for i in range(len(path) - 1))
-            total_distance = sum(G_filtered[path[i]][path[i + 1]]["distance"] for i in range(len(path) - 1))
-
-            st.write("📍 **Optimal Route (min CO₂):**", " → ".join(path))
-            st.write(f"🛣️ Total Distance: {total_distance:.2f} km")
-            st.success(f"🌱 Total Emissions (Shortest Route): {total_emission:,.2f} kg CO₂e")
-
-            # Compare with alternative routes
+            # Precomputed graph for the selected mode (no rebuild per click)
+            G_filtered = GRAPHS[transport_choice]
+
+            # K lowest-emission routes in one search; the first is the optimal route
             max_routes = 5
+            routes = lowest_emission_routes(start, end, max_routes, SC_MTIME, transport_choice)
+
             all_routes = []
-            for idx, route in enumerate(nx.all_simple_paths(G_filtered, source=start, target=end, cutoff=5)):
-                if idx >= max_routes:  
-                    break
-                emission = sum(G_filtered[route[i]][route[i + 1]]["emission"] for i in range(len(route) - 1))
-                distance = sum(G_filtered[route[i]][route[i + 1]]["distance"] for i in range(len(route) - 1))
+            for route in routes:
+                # Sum both weights in one pass, fetching each edge dict once
+                emission = distance = 0.0
+                for u, v in zip(route, route[1:]):
+                    ed = G_filtered[u][v]
+                    emission += ed["emission"]
+                    distance += ed["distance"]
                 all_routes.append({"route": " → ".join(route), "emission": emission, "distance": distance})
 
-            if all_routes:
-                routes_df = pd.DataFrame(all_routes)
-
-                # Bar chart
-                fig, ax = plt.subplots(figsize=(8, 4))
-                ax.bar(routes_df["route"], routes_df["emission"], color="skyblue")
-                ax.set_xlabel("Route (Origin → Destination)")
-                ax.set_ylabel("Emissions (kg CO₂e)")
-                ax.set_title(f"Carbon Emissions for Routes: {start} → {end}")
-                plt.xticks(rotation=30, ha="right")
-
-                st.pyplot(fig)
-                st.dataframe(routes_df)
+            # Optimal route
+            best = all_routes[0]
+            st.write("📍 **Optimal Route (min CO₂):**", best["route"])
+            st.write(f"🛣️ Total Distance: {best['distance']:.2f} km")
+            st.success(f"🌱 Total Emissions (Shortest Route): {best['emission']:,.2f} kg CO₂e")
+
+            # Compare with alternative routes (none when start and destination coincide)
+            if start != end:
+                labels = [r["route"] for r in all_routes]
+                vals = [r["emission"] for r in all_routes]
+
+                # Bar chart (native Streamlit chart, no matplotlib figure per rerun)
+                st.markdown(f"**Carbon Emissions for Routes: {start} → {end}** (kg CO₂e)")
+                st.bar_chart({"route": labels, "emission": vals}, x="route", y="emission")
+                st.dataframe(all_routes)
             else:
                 st.warning("⚠️ No alternative routes found.")
-        except nx.NetworkXNoPath:
+        except (nx.NetworkXNoPath, nx.NodeNotFound):
             st.error("❌ No available route between selected nodes.")
 
 
@@ -157,24 +331,20 @@ elif feature == "Logistics Travel Planner":
 
         # Auto-origin from previous destination
         if i == 0:
-            origin = st.selectbox(f"Origin (Leg {i+1})", sc_df["origin"].unique(), key=f"origin_{i}")
+            origin = st.selectbox(f"Origin (Leg {i+1})", orig_opts, key=f"origin_{i}")
         else:
             origin = prev_destination
             st.text(f"Origin (Leg {i+1}): {origin}")
 
-        destination = st.selectbox(f"Destination (Leg {i+1})", sc_df["destination"].unique(), key=f"dest_{i}")
-        mode = st.selectbox(f"Transport Mode (Leg {i+1})", sc_df["mode"].unique(), key=f"mode_{i}")
+        destination = st.selectbox(f"Destination (Leg {i+1})", dest_opts, key=f"dest_{i}")
+        mode = st.selectbox(f"Transport Mode (Leg {i+1})", mode_opts, key=f"mode_{i}")
         weight = st.number_input(f"Weight (tons) (Leg {i+1})", min_value=1.0, value=10.0, key=f"weight_{i}")
 
         # Auto fetch distance if exists in dataset
-        distance_val = sc_df[
-            (sc_df["origin"] == origin) & 
-            (sc_df["destination"] == destination) & 
-            (sc_df["mode"] == mode)
-        ]["distance_km"]
-
-        if not distance_val.empty:
-            distance = float(distance_val.iloc[0])
+        distance_val = dist_lookup(SC_MTIME).get((origin, destination, mode))
+
+        if distance_val is not None:
+            distance = float(distance_val)
             st.text(f"Distance (km): {distance} (auto-fetched)")
         else:
             distance = st.number_input(f"Distance (km) (Leg {i+1})", min_value=1, value=100, key=f"dist_{i}")
@@ -183,12 +353,18 @@ elif feature == "Logistics Travel Planner":
         prev_destination = destination  # Set for next leg
 
     if st.button("Calculate Total Emissions"):
+        # Encode all modes and predict all legs in one batch
+        mode_to_int = mode_index()
+        mode_encs = [mode_to_int[leg["mode"]] for leg in legs]
+        X = np.array(
+            [[leg["distance"], leg["weight"], enc] for leg, enc in zip(legs, mode_encs)],
+            dtype=np.float64
+        )
+        preds = predict_emissions(X)
+        total_emission = preds.sum()
+
         results = []
-        total_emission = 0
-        for idx, leg in enumerate(legs):
-            mode_enc = LE.transform([leg["mode"]])[0]
-            pred = MODEL.predict([[leg["distance"], leg["weight"], mode_enc]])[0]
-            total_emission += pred
+        for idx, (leg, pred) in enumerate(zip(legs, preds)):
             results.append({
                 "Leg": idx + 1,
                 "Origin": leg["origin"],
@@ -199,23 +375,33 @@ elif feature == "Logistics Travel Planner":
                 "Emission_kgCO2e": pred
             })
 
-        results_df = pd.DataFrame(results)
-
         # Show results table
-        st.dataframe(results_df)
+        st.dataframe(results)
 
         # Show total
         st.success(f"🌱 Total Emissions for Planned Trip: {total_emission:,.2f} kg CO₂e")
 
         # Pie chart of emissions by leg
         fig, ax = plt.subplots()
-        ax.pie(results_df["Emission_kgCO2e"], labels=results_df["Leg"], autopct="%1.1f%%", startangle=90)
+        ax.pie(preds, labels=[r["Leg"] for r in results], autopct="%1.1f%%", startangle=90)
         ax.set_title("Emission Contribution per Leg")
-        st.pyplot(fig)
+        st.pyplot(fig, clear_figure=True)
+        plt.close(fig)
+
+        # Frame only needed for the file exports
+        results_df = pd.DataFrame(results)
+
+        # Download as CSV
+        st.download_button(
+            label="📥 Download Logistics Plan as CSV",
+            data=results_df.to_csv(index=False).encode("utf-8"),
+            file_name="logistics_plan.csv",
+            mime="text/csv"
+        )
 
         # Download as Excel
         buffer = BytesIO()
-        with pd.ExcelWriter(buffer, engine="openpyxl") as writer:
+        with pd.ExcelWriter(buffer, engine=EXCEL_ENGINE) as writer:
             results_df.to_excel(writer, index=False, sheet_name="Logistics Plan")
         st.download_button(
             label="📥 Download Logistics Plan as Excel",
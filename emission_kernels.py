@@ -0,0 +1,54 @@
+# Numba kernels for single-row emission prediction.
+# Kept out of apps.py so the compiled dispatchers stay loaded across Streamlit reruns.
+import numpy as np
+
+try:
+    from numba import njit
+except ImportError:
+    njit = None
+
+HAVE_NUMBA = njit is not None
+
+if HAVE_NUMBA:
+    @njit(cache=True)
+    def predict_tree(x, left, right, feat, thr, val):
+        node = 0
+        while left[node] != -1:
+            if x[feat[node]] <= thr[node]:
+                node = left[node]
+            else:
+                node = right[node]
+        return val[node]
+
+    @njit(cache=True)
+    def predict_forest(x, left, right, feat, thr, val):
+        n_trees = left.shape[0]
+        total = 0.0
+        for t in range(n_trees):
+            total += predict_tree(x, left[t], right[t], feat[t], thr[t], val[t])
+        return total / n_trees
+
+    @njit(cache=True)
+    def predict_linear(x, coef, intercept):
+        total = intercept
+        for j in range(x.shape[0]):
+            total += x[j] * coef[j]
+        return total
+
+
+def stack_trees(trees):
+    # Pad each tree's node arrays to a common length so the forest is one 2-D array per field
+    n_nodes = max(t.node_count for t in trees)
+    left = np.full((len(trees), n_nodes), -1, dtype=np.int64)
+    right = np.full((len(trees), n_nodes), -1, dtype=np.int64)
+    feat = np.zeros((len(trees), n_nodes), dtype=np.int64)
+    thr = np.zeros((len(trees), n_nodes), dtype=np.float64)
+    val = np.zeros((len(trees), n_nodes), dtype=np.float64)
+    for i, t in enumerate(trees):
+        n = t.node_count
+        left[i, :n] = t.children_left
+        right[i, :n] = t.children_right
+        feat[i, :n] = t.feature
+        thr[i, :n] = t.threshold
+        val[i, :n] = t.value[:, 0, 0]
+    return left, right, feat, thr, val
@@ -0,0 +1,159 @@
+# Route search over CSR arrays: Dijkstra plus Yen's K-shortest paths, ordered by
+# (emission, hop count). Compiled with Numba when it is installed; otherwise the same
+# code runs as plain Python, so the routes found never depend on optional packages.
+# Kept out of apps.py so the compiled dispatchers stay loaded across Streamlit reruns.
+import heapq
+
+import numpy as np
+
+try:
+    from numba import njit
+except ImportError:
+    def njit(*args, **kwargs):
+        return lambda f: f
+
+
+@njit(cache=True)
+def _before(heap_d, heap_h, heap_v, i, j):
+    # Heap order: emission, then hop count, then node index
+    if heap_d[i] != heap_d[j]:
+        return heap_d[i] < heap_d[j]
+    if heap_h[i] != heap_h[j]:
+        return heap_h[i] < heap_h[j]
+    return heap_v[i] < heap_v[j]
+
+
+@njit(cache=True)
+def _swap(heap_d, heap_h, heap_v, i, j):
+    heap_d[i], heap_d[j] = heap_d[j], heap_d[i]
+    heap_h[i], heap_h[j] = heap_h[j], heap_h[i]
+    heap_v[i], heap_v[j] = heap_v[j], heap_v[i]
+
+
+@njit(cache=True)
+def _heap_push(heap_d, heap_h, heap_v, size, d, h, v):
+    i = size
+    heap_d[i] = d
+    heap_h[i] = h
+    heap_v[i] = v
+    while i > 0:
+        parent = (i - 1) // 2
+        if not _before(heap_d, heap_h, heap_v, i, parent):
+            break
+        _swap(heap_d, heap_h, heap_v, i, parent)
+        i = parent
+    return size + 1
+
+
+@njit(cache=True)
+def _heap_pop(heap_d, heap_h, heap_v, size):
+    d = heap_d[0]
+    h = heap_h[0]
+    v = heap_v[0]
+    size -= 1
+    heap_d[0] = heap_d[size]
+    heap_h[0] = heap_h[size]
+    heap_v[0] = heap_v[size]
+    i = 0
+    while True:
+        left = 2 * i + 1
+        right = left + 1
+        smallest = i
+        if left < size and _before(heap_d, heap_h, heap_v, left, smallest):
+            smallest = left
+        if right < size and _before(heap_d, heap_h, heap_v, right, smallest):
+            smallest = right
+        if smallest == i:
+            break
+        _swap(heap_d, heap_h, heap_v, i, smallest)
+        i = smallest
+    return d, h, v, size
+
+
+@njit(cache=True)
+def dijkstra(indptr, indices, w, src, tgt, edge_ok, node_ok):
+    n = indptr.shape[0] - 1
+    dist = np.full(n, np.inf)
+    hops = np.zeros(n, dtype=np.int64)
+    pred = np.full(n, -1, dtype=np.int64)
+    done = np.zeros(n, dtype=np.bool_)
+
+    # Lazy-deletion heap: at most one push per relaxed edge plus the source
+    heap_d = np.empty(w.shape[0] + 1, dtype=np.float64)
+    heap_h = np.empty(w.shape[0] + 1, dtype=np.int64)
+    heap_v = np.empty(w.shape[0] + 1, dtype=np.int64)
+    dist[src] = 0.0
+    size = _heap_push(heap_d, heap_h, heap_v, 0, 0.0, 0, src)
+
+    while size > 0:
+        d, h, u, size = _heap_pop(heap_d, heap_h, heap_v, size)
+        if done[u]:
+            continue
+        done[u] = True
+        if u == tgt:
+            break
+        for k in range(indptr[u], indptr[u + 1]):
+            v = indices[k]
+            if not edge_ok[k] or not node_ok[v] or done[v]:
+                continue
+            nd = d + w[k]
+            nh = h + 1
+            if nd < dist[v] or (nd == dist[v] and nh < hops[v]):
+                dist[v] = nd
+                hops[v] = nh
+                pred[v] = u
+                size = _heap_push(heap_d, heap_h, heap_v, size, nd, nh, v)
+    return dist[tgt], hops[tgt], pred
+
+
+def _csr_path(pred, src, tgt):
+    path = [tgt]
+    while path[-1] != src:
+        path.append(int(pred[path[-1]]))
+    return path[::-1]
+
+
+def _csr_edge(indptr, indices, u, v):
+    for k in range(indptr[u], indptr[u + 1]):
+        if indices[k] == v:
+            return k
+
+
+def k_shortest_paths(indptr, indices, w, src, tgt, k):
+    # Yen's algorithm with dijkstra as the spur-path search; returns node-index paths
+    edge_ok = np.ones(w.shape[0], dtype=np.bool_)
+    node_ok = np.ones(indptr.shape[0] - 1, dtype=np.bool_)
+    total, _, pred = dijkstra(indptr, indices, w, src, tgt, edge_ok, node_ok)
+    if np.isinf(total):
+        return []
+
+    found = [_csr_path(pred, src, tgt)]
+    seen = {tuple(found[0])}
+    candidates = []
+    while len(found) < k:
+        last = found[-1]
+        root_cost = 0.0
+        for i in range(len(last) - 1):
+            spur, root = last[i], last[:i + 1]
+
+            # Block edges already used from this root and the root's own nodes
+            edge_ok[:] = True
+            node_ok[:] = True
+            for p in found:
+                if len(p) > i + 1 and p[:i + 1] == root:
+                    edge_ok[_csr_edge(indptr, indices, p[i], p[i + 1])] = False
+            for node in root[:-1]:
+                node_ok[node] = False
+
+            spur_cost, spur_hops, pred = dijkstra(indptr, indices, w, spur, tgt, edge_ok, node_ok)
+            if not np.isinf(spur_cost):
+                path = root[:-1] + _csr_path(pred, spur, tgt)
+                if tuple(path) not in seen:
+                    seen.add(tuple(path))
+                    heapq.heappush(candidates, (root_cost + spur_cost, i + int(spur_hops), path))
+            root_cost += w[_csr_edge(indptr, indices, last[i], last[i + 1])]
+
+        if not candidates:
+            break
+        found.append(heapq.heappop(candidates)[2])
+    return found